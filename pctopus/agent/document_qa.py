@@ -1,23 +1,55 @@
-from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import inspect
+import os
+from typing import Optional, Dict, List, Tuple, Iterator, AsyncIterator
+from pctopus.cache.exact import ExactCache
+from pctopus.cache.semantic import SemanticCache
 from pctopus.llm.base import BaseLLM
 from pctopus.reader.document_reader import DocumentReader
+from pctopus.retrieval.document_index import DocumentIndex, chunk_text
+
+## Bump this whenever the prompt changes so that previously cached responses are invalidated
+PROMPT_VERSION = "v3"
+
+## Prompt used for LLMs that do not accept the context separately from the question
+_PROMPT_TEMPLATE = "Context:\n{ctx}\n\nQuestion: {q}"
+
+## Maximum number of document indexes kept in memory by an agent
+MAX_CACHED_INDEXES = 32
 
 class DocumentQAAgent:
     """Agent for answering questions based on document content."""
 
-    DEFAULT_SYSTEM_INSTRUCTION = """
-    Use the provided context to answer the question. 
-    If you cannot find the answer from the provided context, say "I cannot find the answer in the provided context."
-    """
+    DEFAULT_SYSTEM_INSTRUCTION = (
+        "Use the provided context to answer the question. "
+        "If you cannot find the answer from the provided context, say \"I cannot find the answer in the provided context.\""
+    )
 
-    def __init__(self, llm: BaseLLM):
+    def __init__(self,
+                 llm: BaseLLM,
+                 cache: Optional[SemanticCache] = None,
+                 exact_cache: Optional[ExactCache] = None,
+                 top_k: Optional[int] = None):
         """Initialize the QA agent.
 
         Args:
             llm: Langauge model to use 
+            cache: Optional semantic cache used to reuse responses to similar questions
+            exact_cache: Optional exact-match cache checked before the semantic cache
+            top_k: If set, only the `top_k` document chunks most relevant to the question are sent to the LLM
+                instead of the whole document
         """
         self.llm = llm
         self.reader = DocumentReader()
+        self.cache = cache
+        self.exact_cache = exact_cache
+        self.top_k = top_k
+        self._indexes: Dict[Tuple[str, int, int], DocumentIndex] = {}
+        # LLMs written before `context` was added to `BaseLLM.ask` get the context folded into the prompt
+        ask_parameters = inspect.signature(llm.ask).parameters.values()
+        self._llm_accepts_context = any(parameter.name == "context" or parameter.kind is inspect.Parameter.VAR_KEYWORD
+                                        for parameter in ask_parameters)
 
     def ask(self,
             document_path: str,
@@ -37,18 +69,319 @@ class DocumentQAAgent:
             """
             try:
                 document_content = self.reader.read(document_path)
-
-                question_with_context = f"""
-                Context: {document_content}
-                Question: {question}
-                """
+                doc_hash = self._document_hash(document_content)
+                exact_key, question_embedding, cached_response = self._lookup(doc_hash, question, system_message, model)
+                if cached_response is not None:
+                    return cached_response
 
                 response = self.llm.ask(
-                    prompt=question_with_context,
+                    **self._prompt(question, self._context(document_path, document_content, question_embedding)),
                     system_message=system_message,
                     model=model
                 )
+
+                self._store(exact_key, response, doc_hash, question_embedding, system_message, model)
                 return response
 
             except Exception as e:
                 raise Exception(f"Error processing the document: {str(e)}")
+
+    async def aask(self,
+                   document_path: str,
+                   question: str,
+                   system_message: Optional[str] = DEFAULT_SYSTEM_INSTRUCTION,
+                   model: str = "gpt-3.5-turbo") -> str:
+        """Asynchronous version of `ask`, which does not block the event loop while waiting on the LLM.
+
+        Args:
+            document_path: Path to the document to analyze
+            question: User's question
+            system_message: Optional system instruction for the LLM. By default, it uses the `DEFAULT_SYSTEM_INSTRUCTION` 
+            model: Model to use (default: gpt-3.5-turbo)
+
+        Returns:
+            The agent's response as a string
+        """
+        try:
+            # Parsing is CPU-bound, so it runs in a worker thread
+            document_content = await asyncio.to_thread(self.reader.read, document_path)
+            doc_hash = await asyncio.to_thread(self._document_hash, document_content)
+            return await self._aanswer(document_path, document_content, doc_hash, question, system_message, model)
+
+        except Exception as e:
+            raise Exception(f"Error processing the document: {str(e)}")
+
+    def ask_stream(self,
+                   document_path: str,
+                   question: str,
+                   system_message: Optional[str] = DEFAULT_SYSTEM_INSTRUCTION,
+                   model: str = "gpt-3.5-turbo") -> Iterator[str]:
+        """Ask a question about a document and stream the response as it is generated.
+
+        Args:
+            document_path: Path to the document to analyze
+            question: User's question
+            system_message: Optional system instruction for the LLM. By default, it uses the `DEFAULT_SYSTEM_INSTRUCTION` 
+            model: Model to use (default: gpt-3.5-turbo)
+
+        Yields:
+            Chunks of the agent's response. Cached responses are yielded as a single chunk
+        """
+        try:
+            document_content = self.reader.read(document_path)
+            doc_hash = self._document_hash(document_content)
+            exact_key, question_embedding, cached_response = self._lookup(doc_hash, question, system_message, model)
+            if cached_response is not None:
+                yield cached_response
+                return
+
+            chunks = []
+            for chunk in self.llm.stream(
+                **self._prompt(question, self._context(document_path, document_content, question_embedding)),
+                system_message=system_message,
+                model=model
+            ):
+                chunks.append(chunk)
+                yield chunk
+
+            self._store(exact_key, "".join(chunks), doc_hash, question_embedding, system_message, model)
+
+        except Exception as e:
+            raise Exception(f"Error processing the document: {str(e)}")
+
+    async def aask_stream(self,
+                          document_path: str,
+                          question: str,
+                          system_message: Optional[str] = DEFAULT_SYSTEM_INSTRUCTION,
+                          model: str = "gpt-3.5-turbo") -> AsyncIterator[str]:
+        """Asynchronous version of `ask_stream`.
+
+        Args:
+            document_path: Path to the document to analyze
+            question: User's question
+            system_message: Optional system instruction for the LLM. By default, it uses the `DEFAULT_SYSTEM_INSTRUCTION` 
+            model: Model to use (default: gpt-3.5-turbo)
+
+        Yields:
+            Chunks of the agent's response. Cached responses are yielded as a single chunk
+        """
+        try:
+            document_content = await asyncio.to_thread(self.reader.read, document_path)
+            doc_hash = await asyncio.to_thread(self._document_hash, document_content)
+            exact_key, question_embedding, cached_response = await self._alookup(doc_hash, question, system_message, model)
+            if cached_response is not None:
+                yield cached_response
+                return
+
+            chunks = []
+            async for chunk in self.llm.astream(
+                **self._prompt(question, await self._acontext(document_path, document_content, question_embedding)),
+                system_message=system_message,
+                model=model
+            ):
+                chunks.append(chunk)
+                yield chunk
+
+            self._store(exact_key, "".join(chunks), doc_hash, question_embedding, system_message, model)
+
+        except Exception as e:
+            raise Exception(f"Error processing the document: {str(e)}")
+
+    async def ask_many(self,
+                       document_path: str,
+                       questions: List[str],
+                       system_message: Optional[str] = DEFAULT_SYSTEM_INSTRUCTION,
+                       model: str = "gpt-3.5-turbo",
+                       max_concurrency: int = 5) -> List[str]:
+        """Ask several independent questions about a document concurrently.
+
+        The document is read and hashed once and the questions are sent to the LLM in parallel.
+
+        Args:
+            document_path: Path to the document to analyze
+            questions: User's questions
+            system_message: Optional system instruction for the LLM. By default, it uses the `DEFAULT_SYSTEM_INSTRUCTION` 
+            model: Model to use (default: gpt-3.5-turbo)
+            max_concurrency: Maximum number of requests in flight at once (default: 5)
+
+        Returns:
+            The agent's responses, in the same order as the questions
+        """
+        try:
+            document_content = await asyncio.to_thread(self.reader.read, document_path)
+            doc_hash = await asyncio.to_thread(self._document_hash, document_content)
+            if self.top_k is not None:
+                # Build the index up front rather than once per concurrent question
+                await self._aget_index(document_path, document_content)
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def answer(question: str) -> str:
+                async with semaphore:
+                    return await self._aanswer(document_path, document_content, doc_hash, question, system_message, model)
+
+            return await asyncio.gather(*(answer(question) for question in questions))
+
+        except Exception as e:
+            raise Exception(f"Error processing the document: {str(e)}")
+
+    async def _aanswer(self,
+                       document_path: str,
+                       document_content: str,
+                       doc_hash: Optional[str],
+                       question: str,
+                       system_message: Optional[str],
+                       model: str) -> str:
+        """Answer a question about already-read document content, consulting the caches first"""
+        exact_key, question_embedding, cached_response = await self._alookup(doc_hash, question, system_message, model)
+        if cached_response is not None:
+            return cached_response
+
+        response = await self.llm.aask(
+            **self._prompt(question, await self._acontext(document_path, document_content, question_embedding)),
+            system_message=system_message,
+            model=model
+        )
+
+        self._store(exact_key, response, doc_hash, question_embedding, system_message, model)
+        return response
+
+    def _prompt(self, question: str, context: str) -> Dict[str, str]:
+        """Return the prompt arguments for the LLM, passing the context separately when the LLM supports it"""
+        if self._llm_accepts_context:
+            return {"prompt": question, "context": context}
+        return {"prompt": _PROMPT_TEMPLATE.format(ctx=context, q=question)}
+
+    def _needs_embedding(self) -> bool:
+        """Whether the question embedding is needed by the semantic cache or for retrieval"""
+        return self.cache is not None or self.top_k is not None
+
+    def _context(self, document_path: str, document_content: str, question_embedding: Optional[List[float]]) -> str:
+        """Return the context sent to the LLM: the whole document, or the chunks relevant to the question"""
+        if self.top_k is None:
+            return document_content
+        index = self._get_index(document_path, document_content)
+        return "\n\n".join(index.search(question_embedding, self.top_k))
+
+    async def _acontext(self, document_path: str, document_content: str, question_embedding: Optional[List[float]]) -> str:
+        """Asynchronous version of `_context`"""
+        if self.top_k is None:
+            return document_content
+        index = await self._aget_index(document_path, document_content)
+        return "\n\n".join(index.search(question_embedding, self.top_k))
+
+    def _get_index(self, document_path: str, document_content: str) -> DocumentIndex:
+        """Return the index of a document, building it on first use from the already-read content"""
+        key = self._index_key(document_path)
+        if key not in self._indexes:
+            chunks = chunk_text(document_content)
+            self._add_index(key, DocumentIndex(chunks, self.llm.embed_many(chunks)))
+        return self._indexes[key]
+
+    async def _aget_index(self, document_path: str, document_content: str) -> DocumentIndex:
+        """Asynchronous version of `_get_index`"""
+        key = self._index_key(document_path)
+        if key not in self._indexes:
+            chunks = await asyncio.to_thread(chunk_text, document_content)
+            self._add_index(key, DocumentIndex(chunks, await self.llm.aembed_many(chunks)))
+        return self._indexes[key]
+
+    @staticmethod
+    def _index_key(document_path: str) -> Tuple[str, int, int]:
+        """Identify a version of a document by its path, modification time and size"""
+        stat = os.stat(document_path)
+        return os.path.abspath(document_path), stat.st_mtime_ns, stat.st_size
+
+    def _add_index(self, key: Tuple[str, int, int], index: DocumentIndex) -> None:
+        """Store an index, evicting the oldest one when the limit is reached"""
+        if len(self._indexes) >= MAX_CACHED_INDEXES:
+            self._indexes.pop(next(iter(self._indexes)))
+        self._indexes[key] = index
+
+    def _lookup(self,
+                doc_hash: Optional[str],
+                question: str,
+                system_message: Optional[str],
+                model: str) -> Tuple[Optional[str], Optional[List[float]], Optional[str]]:
+        """Consult the caches for a question.
+
+        Returns:
+            The exact-match cache key, the question embedding (if needed) and the cached response, if any
+        """
+        exact_key = self._exact_key(doc_hash, question, system_message, model)
+
+        # Identical queries are answered without computing an embedding
+        cached_response = self._lookup_exact(exact_key)
+        if cached_response is not None:
+            return exact_key, None, cached_response
+
+        question_embedding = self.llm.embed(question) if self._needs_embedding() else None
+        cached_response = self._lookup_similar(exact_key, doc_hash, question_embedding, system_message, model)
+        return exact_key, question_embedding, cached_response
+
+    async def _alookup(self,
+                       doc_hash: Optional[str],
+                       question: str,
+                       system_message: Optional[str],
+                       model: str) -> Tuple[Optional[str], Optional[List[float]], Optional[str]]:
+        """Asynchronous version of `_lookup`"""
+        exact_key = self._exact_key(doc_hash, question, system_message, model)
+
+        cached_response = self._lookup_exact(exact_key)
+        if cached_response is not None:
+            return exact_key, None, cached_response
+
+        question_embedding = await self.llm.aembed(question) if self._needs_embedding() else None
+        cached_response = self._lookup_similar(exact_key, doc_hash, question_embedding, system_message, model)
+        return exact_key, question_embedding, cached_response
+
+    def _document_hash(self, document_content: str) -> Optional[str]:
+        """Return the SHA-256 hash of the document content used by the caches, or None if no cache is configured"""
+        if self.cache is None and self.exact_cache is None:
+            return None
+        return hashlib.sha256(document_content.encode('utf-8')).hexdigest()
+
+    def _exact_key(self,
+                   doc_hash: Optional[str],
+                   question: str,
+                   system_message: Optional[str],
+                   model: str) -> Optional[str]:
+        """Compute the exact-match cache key, or None if the exact-match cache is not configured"""
+        if self.exact_cache is None:
+            return None
+        return self.exact_cache.make_key(doc_hash, question, system_message, model, PROMPT_VERSION, self.top_k)
+
+    def _lookup_exact(self, exact_key: Optional[str]) -> Optional[str]:
+        """Return the response cached for an identical query, if any"""
+        if self.exact_cache is None:
+            return None
+        return self.exact_cache.get(exact_key)
+
+    def _lookup_similar(self,
+                        exact_key: Optional[str],
+                        doc_hash: Optional[str],
+                        question_embedding: Optional[List[float]],
+                        system_message: Optional[str],
+                        model: str) -> Optional[str]:
+        """Return the response cached for a similar question on the same document and settings, if any.
+
+        Hits are also stored in the exact-match cache so that repeating the question skips the embedding.
+        """
+        if self.cache is None:
+            return None
+        cached_response = self.cache.get(doc_hash, question_embedding, PROMPT_VERSION, model, system_message, self.top_k)
+        if cached_response is not None:
+            self._store(exact_key, cached_response)
+        return cached_response
+
+    def _store(self,
+               exact_key: Optional[str],
+               response: str,
+               doc_hash: Optional[str] = None,
+               question_embedding: Optional[List[float]] = None,
+               system_message: Optional[str] = None,
+               model: Optional[str] = None) -> None:
+        """Store a response in the configured caches"""
+        if self.cache is not None and question_embedding is not None:
+            self.cache.put(doc_hash, question_embedding, response, PROMPT_VERSION, model, system_message, self.top_k)
+        if self.exact_cache is not None:
+            self.exact_cache.set(exact_key, response)
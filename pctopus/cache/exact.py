@@ -0,0 +1,64 @@
+import hashlib
+from typing import Optional
+
+## Cached responses expire after 7 days
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+## A cache that returns stored responses for queries identical to ones already answered
+class ExactCache:
+    """Response cache keyed by the SHA-256 hash of
+    `(doc_hash, question, system_message, model, prompt_version, top_k)`."""
+
+    def __init__(self, directory: Optional[str] = None, ttl: int = DEFAULT_TTL_SECONDS):
+        """Initialize the exact-match cache.
+
+        Args:
+            directory: Directory used to persist the cache. A temporary directory is used if not provided
+            ttl: Time to live of a cached response in seconds (default: 7 days)
+        """
+        try:
+            from diskcache import Cache
+        except ImportError:
+            raise ImportError("diskcache is required to use the exact-match cache. Install it using: pip install diskcache")
+
+        self.store = Cache(directory)
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(doc_hash: str,
+                 question: str,
+                 system_message: Optional[str],
+                 model: str,
+                 prompt_version: str,
+                 top_k: Optional[int] = None) -> str:
+        """
+        Build the cache key for a query
+
+        Args:
+            doc_hash (str): SHA-256 hash of the document content
+            question (str): User's question
+            system_message (Optional[str]): System instruction for the LLM
+            model (str): Model used to answer the question
+            prompt_version (str): Version of the prompt used to generate the response
+            top_k (Optional[int]): Number of retrieved chunks used as context, or None if the whole document is used
+
+        Returns:
+            str: Hex digest identifying the query
+        """
+        parts = [
+            doc_hash.encode('utf-8'),
+            question.strip().encode('utf-8'),
+            (system_message or "").encode('utf-8'),
+            model.encode('utf-8'),
+            prompt_version.encode('utf-8'),
+            str(top_k).encode('utf-8'),
+        ]
+        return hashlib.sha256(b"\x1f".join(parts)).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None if there is no hit"""
+        return self.store.get(key)
+
+    def set(self, key: str, response: str) -> None:
+        """Store the response for a key"""
+        self.store.set(key, response, expire=self.ttl)
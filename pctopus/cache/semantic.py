@@ -0,0 +1,111 @@
+import hashlib
+import math
+import time
+from typing import Optional, List
+
+## Cached responses expire after 7 days
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    """Compute the cosine similarity between two vectors"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    if norm == 0:
+        return 0.0
+    return dot / norm
+
+## A cache that returns stored responses for questions similar in meaning to ones already answered
+class SemanticCache:
+    """Response cache keyed by document hash and question embedding.
+
+    Entries are stored as `(embedding, response, doc_hash, prompt_version, settings_hash, expires_at)`
+    tuples, grouped by document hash and persisted with `diskcache`. `settings_hash` identifies the
+    model, system message and retrieval setting the response was generated with.
+    """
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 threshold: float = 0.92,
+                 ttl: int = DEFAULT_TTL_SECONDS):
+        """Initialize the semantic cache.
+
+        Args:
+            directory: Directory used to persist the cache. A temporary directory is used if not provided
+            threshold: Minimum cosine similarity for a cached question to count as a hit (default: 0.92)
+            ttl: Time to live of a cached response in seconds (default: 7 days)
+        """
+        try:
+            from diskcache import Cache
+        except ImportError:
+            raise ImportError("diskcache is required to use the semantic cache. Install it using: pip install diskcache")
+
+        self.store = Cache(directory)
+        self.threshold = threshold
+        self.ttl = ttl
+
+    @staticmethod
+    def settings_hash(model: str, system_message: Optional[str], top_k: Optional[int] = None) -> str:
+        """Identify the model, system message and number of retrieved chunks a response is generated with"""
+        parts = [model.encode('utf-8'), (system_message or "").encode('utf-8'), str(top_k).encode('utf-8')]
+        return hashlib.sha256(b"\x1f".join(parts)).hexdigest()
+
+    def get(self,
+            doc_hash: str,
+            embedding: List[float],
+            prompt_version: str,
+            model: str,
+            system_message: Optional[str],
+            top_k: Optional[int] = None) -> Optional[str]:
+        """
+        Look up the response for the most similar cached question on the same document,
+        generated with the same prompt version, model, system message and retrieval setting
+
+        Args:
+            doc_hash (str): SHA-256 hash of the document content
+            embedding (List[float]): Embedding of the question
+            prompt_version (str): Version of the prompt used to generate responses
+            model (str): Model used to answer the question
+            system_message (Optional[str]): System instruction for the LLM
+            top_k (Optional[int]): Number of retrieved chunks used as context, or None if the whole document is used
+
+        Returns:
+            Optional[str]: The cached response, or None if there is no hit
+        """
+        now = time.time()
+        settings = self.settings_hash(model, system_message, top_k)
+        best_response, best_score = None, self.threshold
+        for cached_embedding, response, _, version, cached_settings, expires_at in self.store.get(doc_hash, []):
+            if version != prompt_version or cached_settings != settings or expires_at <= now:
+                continue
+            score = cosine_similarity(embedding, cached_embedding)
+            if score > best_score:
+                best_response, best_score = response, score
+        return best_response
+
+    def put(self,
+            doc_hash: str,
+            embedding: List[float],
+            response: str,
+            prompt_version: str,
+            model: str,
+            system_message: Optional[str],
+            top_k: Optional[int] = None) -> None:
+        """
+        Store a response for a question on a document
+
+        Args:
+            doc_hash (str): SHA-256 hash of the document content
+            embedding (List[float]): Embedding of the question
+            response (str): The response to cache
+            prompt_version (str): Version of the prompt used to generate the response
+            model (str): Model used to generate the response
+            system_message (Optional[str]): System instruction used to generate the response
+            top_k (Optional[int]): Number of retrieved chunks used as context, or None if the whole document is used
+        """
+        now = time.time()
+        settings = self.settings_hash(model, system_message, top_k)
+        with self.store.transact():
+            entries = [entry for entry in self.store.get(doc_hash, [])
+                       if entry[3] == prompt_version and entry[5] > now]
+            entries.append((embedding, response, doc_hash, prompt_version, settings, now + self.ttl))
+            self.store.set(doc_hash, entries, expire=self.ttl)
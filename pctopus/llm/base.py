@@ -1,12 +1,46 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, List, Iterator, AsyncIterator
 
 class BaseLLM(ABC):
     """Base class for all LLM implementations"""
 
     @abstractmethod
-    def ask(self, prompt: str, system_message: Optional[str] = None):
-        """Send a prompt to the LLM and get a response."""
+    def ask(self, prompt: str, system_message: Optional[str] = None, *, context: Optional[str] = None):
+        """Send a prompt to the LLM, along with optional context, and get a response."""
         pass
 
- 
\ No newline at end of file
+    async def aask(self, prompt: str, system_message: Optional[str] = None, **kwargs):
+        """Asynchronously send a prompt to the LLM and get a response.
+
+        Runs `ask` in a worker thread unless overridden with a natively asynchronous implementation.
+        """
+        return await asyncio.to_thread(self.ask, prompt, system_message, **kwargs)
+
+    def stream(self, prompt: str, system_message: Optional[str] = None, **kwargs) -> Iterator[str]:
+        """Send a prompt to the LLM and yield the response in chunks.
+
+        Yields the whole response at once unless overridden with a streaming implementation.
+        """
+        yield self.ask(prompt, system_message, **kwargs)
+
+    async def astream(self, prompt: str, system_message: Optional[str] = None, **kwargs) -> AsyncIterator[str]:
+        """Asynchronously send a prompt to the LLM and yield the response in chunks."""
+        yield await self.aask(prompt, system_message, **kwargs)
+
+    def embed(self, text: str) -> List[float]:
+        """Get an embedding vector for the given text."""
+        raise NotImplementedError(f"{type(self).__name__} does not support embeddings")
+
+    async def aembed(self, text: str) -> List[float]:
+        """Asynchronously get an embedding vector for the given text."""
+        return await asyncio.to_thread(self.embed, text)
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Get an embedding vector for each of the given texts."""
+        return [self.embed(text) for text in texts]
+
+    async def aembed_many(self, texts: List[str]) -> List[List[float]]:
+        """Asynchronously get an embedding vector for each of the given texts."""
+        return await asyncio.to_thread(self.embed_many, texts)
+
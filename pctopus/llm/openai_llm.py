@@ -1,8 +1,33 @@
+import asyncio
 import os
-from typing import Optional, List, Dict, Any
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, Iterator, AsyncIterator, Callable, Awaitable, Tuple
 import openai
 from dotenv import load_dotenv
 from pctopus.llm.base import BaseLLM
+from pctopus.llm.rate_limiter import AsyncRateLimiter
+
+## Limits shared by all async requests made from this process
+MAX_CONCURRENT_REQUESTS = 20
+MAX_REQUESTS_PER_MINUTE = 3500
+MAX_RETRIES = 4
+
+## asyncio primitives are bound to the event loop they are first used on, so each running loop
+## gets its own semaphore and rate limiter, shared by all OpenAILLM instances on that loop
+_loop_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, AsyncRateLimiter]]" = weakref.WeakKeyDictionary()
+
+def _get_loop_limits() -> Tuple[asyncio.Semaphore, AsyncRateLimiter]:
+    """Return the concurrency and rate limits of the running event loop, creating them on first use"""
+    loop = asyncio.get_running_loop()
+    limits = _loop_limits.get(loop)
+    if limits is None:
+        limits = (asyncio.Semaphore(MAX_CONCURRENT_REQUESTS), AsyncRateLimiter(MAX_REQUESTS_PER_MINUTE, 60))
+        _loop_limits[loop] = limits
+    return limits
+
+## Template of the message carrying the context, kept free of indentation so that no tokens are wasted
+_CONTEXT_TEMPLATE = "Context:\n{ctx}"
 
 class OpenAILLM(BaseLLM):
     """Class for interacting with OpenAI Large Language Models"""
@@ -13,31 +38,241 @@ class OpenAILLM(BaseLLM):
         api_key = os.getenv('OPENAI_API_KEY')
 
         self.client = openai.OpenAI(api_key = api_key)
+        self.aclient = openai.AsyncOpenAI(api_key = api_key)
 
     def ask(self,
             prompt: str,
             system_message: Optional[str] = None,
-            model: str = "gpt-3.5-turbo") -> str:
+            model: str = "gpt-3.5-turbo",
+            *,
+            context: Optional[str] = None) -> str:
         """Method to get response from an OpenAI LLM. 
 
         Args:
-            prompt: The prompt to the LLM, which includes user's message and context
+            prompt: The prompt to the LLM, usually the user's message
             system_message: Optional system message to control the LLM's behavior
             model: The model to use (default: gpt-3.5-turbo)
+            context: Optional context (e.g. document content) sent as its own message ahead of the prompt
 
         Returns:
             The model's response as a string
         """
-        messages = []
-        if system_message:
-            messages.append({"role": "system", "content": system_message})
-        messages.append({"role": "user", "content": prompt})
-
         response = self.client.chat.completions.create(
             model=model,
-            messages=messages,
+            messages=self._build_messages(prompt, system_message, context),
+        )
+
+        return response.choices[0].message.content
+
+    async def aask(self,
+                   prompt: str,
+                   system_message: Optional[str] = None,
+                   model: str = "gpt-3.5-turbo",
+                   *,
+                   context: Optional[str] = None) -> str:
+        """Method to asynchronously get response from an OpenAI LLM. 
+
+        Args:
+            prompt: The prompt to the LLM, usually the user's message
+            system_message: Optional system message to control the LLM's behavior
+            model: The model to use (default: gpt-3.5-turbo)
+            context: Optional context (e.g. document content) sent as its own message ahead of the prompt
+
+        Returns:
+            The model's response as a string
+        """
+        response = await self._arequest(
+            self.aclient.chat.completions.create,
+            model=model,
+            messages=self._build_messages(prompt, system_message, context),
         )
 
         return response.choices[0].message.content
 
+    def stream(self,
+               prompt: str,
+               system_message: Optional[str] = None,
+               model: str = "gpt-3.5-turbo",
+               *,
+               context: Optional[str] = None) -> Iterator[str]:
+        """Method to stream a response from an OpenAI LLM as it is generated. 
+
+        Args:
+            prompt: The prompt to the LLM, usually the user's message
+            system_message: Optional system message to control the LLM's behavior
+            model: The model to use (default: gpt-3.5-turbo)
+            context: Optional context (e.g. document content) sent as its own message ahead of the prompt
+
+        Yields:
+            Chunks of the model's response
+        """
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=self._build_messages(prompt, system_message, context),
+            stream=True,
+        )
+
+        for chunk in response:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
+
+    async def astream(self,
+                      prompt: str,
+                      system_message: Optional[str] = None,
+                      model: str = "gpt-3.5-turbo",
+                      *,
+                      context: Optional[str] = None) -> AsyncIterator[str]:
+        """Method to asynchronously stream a response from an OpenAI LLM as it is generated. 
+
+        Args:
+            prompt: The prompt to the LLM, usually the user's message
+            system_message: Optional system message to control the LLM's behavior
+            model: The model to use (default: gpt-3.5-turbo)
+            context: Optional context (e.g. document content) sent as its own message ahead of the prompt
+
+        Yields:
+            Chunks of the model's response
+        """
+        # The concurrency slot is held until the stream is fully consumed
+        async with self._alimited(
+            self.aclient.chat.completions.create,
+            model=model,
+            messages=self._build_messages(prompt, system_message, context),
+            stream=True,
+        ) as response:
+            async for chunk in response:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+
+    def embed(self,
+              text: str,
+              model: str = "text-embedding-3-small") -> List[float]:
+        """Method to get an embedding vector from an OpenAI embedding model.
+
+        Args:
+            text: The text to embed
+            model: The embedding model to use (default: text-embedding-3-small)
+
+        Returns:
+            The embedding vector as a list of floats
+        """
+        response = self.client.embeddings.create(
+            model=model,
+            input=text,
+        )
+
+        return response.data[0].embedding
+
+    async def aembed(self,
+                     text: str,
+                     model: str = "text-embedding-3-small") -> List[float]:
+        """Method to asynchronously get an embedding vector from an OpenAI embedding model.
+
+        Args:
+            text: The text to embed
+            model: The embedding model to use (default: text-embedding-3-small)
+
+        Returns:
+            The embedding vector as a list of floats
+        """
+        response = await self._arequest(
+            self.aclient.embeddings.create,
+            model=model,
+            input=text,
+        )
+
+        return response.data[0].embedding
+
+    def embed_many(self,
+                   texts: List[str],
+                   model: str = "text-embedding-3-small",
+                   batch_size: int = 100) -> List[List[float]]:
+        """Method to get embedding vectors for several texts, batching them into as few requests as possible.
+
+        Args:
+            texts: The texts to embed
+            model: The embedding model to use (default: text-embedding-3-small)
+            batch_size: Maximum number of texts sent per request (default: 100)
+
+        Returns:
+            The embedding vectors, in the same order as the texts
+        """
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            response = self.client.embeddings.create(
+                model=model,
+                input=texts[start:start + batch_size],
+            )
+            embeddings.extend(item.embedding for item in response.data)
+
+        return embeddings
+
+    async def aembed_many(self,
+                          texts: List[str],
+                          model: str = "text-embedding-3-small",
+                          batch_size: int = 100) -> List[List[float]]:
+        """Method to asynchronously get embedding vectors for several texts, batching them into as few requests as possible.
+
+        Args:
+            texts: The texts to embed
+            model: The embedding model to use (default: text-embedding-3-small)
+            batch_size: Maximum number of texts sent per request (default: 100)
+
+        Returns:
+            The embedding vectors, in the same order as the texts
+        """
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            response = await self._arequest(
+                self.aclient.embeddings.create,
+                model=model,
+                input=texts[start:start + batch_size],
+            )
+            embeddings.extend(item.embedding for item in response.data)
+
+        return embeddings
+
+    async def _arequest(self, create: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        """Call an async OpenAI endpoint within the shared concurrency and rate limits"""
+        async with self._alimited(create, **kwargs) as response:
+            return response
+
+    @asynccontextmanager
+    async def _alimited(self, create: Callable[..., Awaitable[Any]], **kwargs) -> AsyncIterator[Any]:
+        """Call an async OpenAI endpoint within the shared concurrency and rate limits,
+        holding the concurrency slot until the context exits.
+
+        Rate limit errors are retried with exponential backoff, outside of the concurrency limit.
+        """
+        semaphore, rate_limiter = _get_loop_limits()
+        for attempt in range(MAX_RETRIES):
+            async with semaphore:
+                await rate_limiter.acquire()
+                try:
+                    response = await create(**kwargs)
+                except openai.RateLimitError:
+                    if attempt == MAX_RETRIES - 1:
+                        raise
+                else:
+                    yield response
+                    return
+            await asyncio.sleep(2 ** attempt)
+
+    @staticmethod
+    def _build_messages(prompt: str,
+                        system_message: Optional[str] = None,
+                        context: Optional[str] = None) -> List[Dict[str, str]]:
+        """Build the chat messages sent to the model.
+
+        The system message and context come first and stay identical across questions about the same
+        document, so OpenAI's automatic prompt caching can reuse the processed prefix.
+        """
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        if context:
+            messages.append({"role": "system", "content": _CONTEXT_TEMPLATE.format(ctx=context)})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
     
\ No newline at end of file
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+## A token bucket that limits how many requests can be started within a time period
+class AsyncRateLimiter:
+    """Asynchronous token-bucket rate limiter, usable as `async with limiter:`."""
+
+    def __init__(self, max_rate: float, time_period: float = 60):
+        """Initialize the rate limiter.
+
+        Args:
+            max_rate: Maximum number of requests allowed per time period
+            time_period: Length of the time period in seconds (default: 60)
+        """
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = max_rate
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request is allowed, then consume one token"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                refill = (now - self._updated_at) * self.max_rate / self.time_period
+                self._tokens = min(self.max_rate, self._tokens + refill)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
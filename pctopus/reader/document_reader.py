@@ -1,5 +1,50 @@
+import io
+import mmap
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Callable, Iterable, Iterator, Optional, List, Tuple
+
+## Optional parsers are imported once; a missing parser is reported when a file that needs it is read
+try:
+    from pymupdf import open as _pdf_open
+except ImportError:
+    _pdf_open = None
+
+try:
+    from PyPDF2 import PdfReader as _PdfReader
+except ImportError:
+    _PdfReader = None
+
+try:
+    from docx import Document as _WordDocument
+except ImportError:
+    _WordDocument = None
+
+## PDFs with at least this many pages are extracted in parallel, across up to this many worker processes.
+## Workers are spawned, which re-imports the `__main__` module, so scripts that read large PDFs need an
+## `if __name__ == "__main__":` guard to use the pool; without one, extraction falls back to a single process
+PARALLEL_PAGE_THRESHOLD = 64
+MAX_PDF_WORKERS = 8
+
+## A single pool is shared by all PDF reads. Its workers are spawned rather than forked, since reads
+## usually happen in a multi-threaded process (e.g. the Gradio server), where forking can deadlock
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+## Write page/paragraph texts into a single buffer instead of building intermediate strings
+def _join_texts(texts: Iterable[Optional[str]]) -> str:
+    """Join texts with newlines, treating missing text as empty"""
+    buffer = io.StringIO()
+    for i, text in enumerate(texts):
+        if i:
+            buffer.write('\n')
+        buffer.write(text or '')
+    return buffer.getvalue()
 
 ## This function is used to read from text files
 def read_txt_file(file_path: str) -> str:
@@ -17,40 +62,159 @@ def read_txt_file(file_path: str) -> str:
                 continue
         raise
 
+## Pages without fonts (e.g. scanned images) cannot contain extractable text, so they are skipped
+## before their image/graphics streams are decompressed
+def _pymupdf_page_text(page) -> str:
+    """Extract text from a PyMuPDF page, skipping pages without fonts"""
+    if not page.get_fonts(full=False):
+        return ''
+    return page.get_text()
+
+def _pypdf2_page_text(page) -> Optional[str]:
+    """Extract text from a PyPDF2 page, skipping pages without fonts or form XObjects"""
+    resources = page.get('/Resources')
+    if resources is None:
+        return ''
+    resources = resources.get_object()
+    if resources.get('/Font') is None and not _has_form_xobject(resources):
+        return ''
+    return page.extract_text()
+
+## Text can also be drawn inside form XObjects, which carry their own fonts
+def _has_form_xobject(resources) -> bool:
+    """Whether a PyPDF2 resource dictionary contains a form XObject"""
+    xobjects = resources.get('/XObject')
+    if xobjects is None:
+        return False
+    return any(xobject.get_object().get('/Subtype') == '/Form' for xobject in xobjects.get_object().values())
+
+## PyMuPDF documents cannot be shared between threads, so each worker process opens its own copy
+def _pymupdf_page_range_texts(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract text from pages `start` to `stop` of a PDF file"""
+    with _pdf_open(file_path) as doc:
+        return [_pymupdf_page_text(doc[i]) for i in range(start, stop)]
+
+def _pymupdf_parallel_texts(file_path: str, page_count: int) -> List[str]:
+    """Extract text from all pages of a PDF file, splitting the pages across worker processes"""
+    workers = _pdf_worker_count()
+    step = -(-page_count // workers)
+    starts = range(0, page_count, step)
+    stops = [min(start + step, page_count) for start in starts]
+    pool = _get_pdf_pool()
+    try:
+        ranges = pool.map(_pymupdf_page_range_texts, [file_path] * len(starts), starts, stops)
+        return [text for texts in ranges for text in texts]
+    except BrokenProcessPool:
+        # A worker died (e.g. it was killed for running out of memory, or could not start), so the pool is
+        # discarded for the next read to create a fresh one, and this document is extracted serially
+        _reset_pdf_pool(pool)
+        with _pdf_open(file_path) as doc:
+            return [_pymupdf_page_text(page) for page in doc]
+
+def _pdf_worker_count() -> int:
+    """Number of worker processes used to extract PDF text"""
+    return min(os.cpu_count() or 1, MAX_PDF_WORKERS)
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Return the shared PDF extraction pool, creating it on first use"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=_pdf_worker_count(),
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _pdf_pool
+
+def _reset_pdf_pool(broken_pool: ProcessPoolExecutor) -> None:
+    """Discard a broken PDF extraction pool, unless another read has already replaced it"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is broken_pool:
+            _pdf_pool = None
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
 ## This function is used to read the text content from PDF files
 def read_pdf_file(file_path: str) -> str:
     """Read content from a PDF file"""
-    try:
-        from PyPDF2 import PdfReader
-        reader = PdfReader(file_path)
-        return '\n'.join(page.extract_text() for page in reader.pages)
-    except ImportError:
-        raise ImportError("PyPDF2 is required to read PDF files. Install it using: pip install PyPDF2")
+    if _pdf_open is not None:
+        with _pdf_open(file_path) as doc:
+            page_count = doc.page_count
+            if page_count < PARALLEL_PAGE_THRESHOLD or _pdf_worker_count() == 1:
+                return _join_texts(_pymupdf_page_text(page) for page in doc)
+        return _join_texts(_pymupdf_parallel_texts(file_path, page_count))
+
+    return _join_texts(_iter_pypdf2_pages(file_path))
+
+## This function is used to read the text content from PDF files one page at a time
+def iter_pdf_file(file_path: str) -> Iterator[str]:
+    """Yield the content of a PDF file page by page"""
+    if _pdf_open is not None:
+        with _pdf_open(file_path) as doc:
+            for page in doc:
+                yield _pymupdf_page_text(page)
+        return
+
+    yield from _iter_pypdf2_pages(file_path)
+
+def _iter_pypdf2_pages(file_path: str) -> Iterator[str]:
+    """Yield the content of a PDF file page by page using PyPDF2"""
+    # Fall back to the slower PyPDF2 if PyMuPDF is not installed
+    if _PdfReader is None:
+        raise ImportError("PyMuPDF or PyPDF2 is required to read PDF files. Install it using: pip install pymupdf")
+
+    # PyPDF2 reads a file path fully into memory, whereas a memory map only pages in what is parsed
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        reader = _PdfReader(mapped)
+        for page in reader.pages:
+            yield _pypdf2_page_text(page) or ''
 
 ## This function is used to read the text content from Word document (.doc, .docx)
 def read_word_file(file_path: str) -> str:
     """Read content from a Word document"""
-    try:
-        from docx import Document
-        doc = Document(file_path)
-        return '\n'.join(paragraph.text for paragraph in doc.paragraphs)
-    except ImportError:
+    return _join_texts(iter_word_file(file_path))
+
+## This function is used to read the text content from Word document (.doc, .docx) one paragraph at a time
+def iter_word_file(file_path: str) -> Iterator[str]:
+    """Yield the content of a Word document paragraph by paragraph"""
+    if _WordDocument is None:
         raise ImportError("python-docx is required to read Word files. Install it using: pip install python-docx")
 
+    doc = _WordDocument(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text
+
+## Text files are decoded as a whole, since the fallback encodings can only be chosen after a failed decode
+def iter_txt_file(file_path: str) -> Iterator[str]:
+    """Yield the content of a text file"""
+    yield read_txt_file(file_path)
+
+## Parsed documents are memoized by their path, modification time and size, so edited files are re-read
+@lru_cache(maxsize=32)
+def _read_cached(reader: Callable, file_path: str, mtime_ns: int, size: int) -> str:
+    """Read a document with the given reader, caching the result"""
+    return reader(file_path)
+
+## Supported file formats and their corresponding reader functions
+EXT_DISPATCH: Dict[str, Callable] = {
+    '.txt': read_txt_file,
+    '.pdf': read_pdf_file,
+    '.doc': read_word_file,
+    '.docx': read_word_file,
+}
+SUPPORTED_FORMATS: Tuple[str, ...] = tuple(EXT_DISPATCH)
+
+## Supported file formats and their corresponding streaming reader functions
+ITER_DISPATCH: Dict[str, Callable] = {
+    '.txt': iter_txt_file,
+    '.pdf': iter_pdf_file,
+    '.doc': iter_word_file,
+    '.docx': iter_word_file,
+}
+
 ## A common class that we can use to extract text content from text files, PDFs and Word document
 class DocumentReader:
-    def __init__(self):
-        # Register file formats and their corresponding reader functions
-        self.readers: Dict[str, Callable] = {
-            '.txt': read_txt_file,
-            '.pdf': read_pdf_file,
-            '.doc': read_word_file,
-            '.docx': read_word_file,
-        }
-
-    def supported_formats(self) -> list[str]:
-        """Return list of supported file formats"""
-        return list(self.readers.keys())
+    def supported_formats(self) -> Tuple[str, ...]:
+        """Return the supported file formats"""
+        return SUPPORTED_FORMATS
 
     def read(self, file_path: str) -> str:
         """
@@ -66,14 +230,43 @@ class DocumentReader:
             ValueError: If the file format is not supported
             FileNotFoundError: If the file doesn't exist
         """
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
+        stat = _stat(file_path)
+        reader = _dispatch(EXT_DISPATCH, file_path)
+        return _read_cached(reader, os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
 
-        file_extension = Path(file_path).suffix.lower()
+    def iter_read(self, file_path: str) -> Iterator[str]:
+        """
+        Read content from a document file piece by piece (pages of a PDF, paragraphs of a Word document),
+        so that large documents can be processed without holding all of their text in memory.
+        Joining the pieces with newlines gives the same text as `read`.
         
-        reader = self.readers.get(file_extension)
-        if reader is None:
-            supported = ', '.join(self.supported_formats())
-            raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are: {supported}")
+        Args:
+            file_path (str): Path to the document file
+            
+        Yields:
+            str: Text content of each page or paragraph of the document
             
+        Raises:
+            ValueError: If the file format is not supported
+            FileNotFoundError: If the file doesn't exist
+        """
+        _stat(file_path)
+        reader = _dispatch(ITER_DISPATCH, file_path)
         return reader(file_path)
+
+def _stat(file_path: str) -> os.stat_result:
+    """Stat a document file, raising FileNotFoundError if it doesn't exist"""
+    try:
+        return os.stat(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+def _dispatch(readers: Dict[str, Callable], file_path: str) -> Callable:
+    """Return the reader function for a document file based on its extension"""
+    file_extension = Path(file_path).suffix.lower()
+    
+    reader = readers.get(file_extension)
+    if reader is None:
+        supported = ', '.join(SUPPORTED_FORMATS)
+        raise ValueError(f"Unsupported file format: {file_extension}. Supported formats are: {supported}")
+    return reader
@@ -0,0 +1,84 @@
+from typing import Iterable, Iterator, List
+import numpy as np
+
+## Roughly 500 tokens, assuming ~4 characters per token
+DEFAULT_CHUNK_SIZE = 2000
+
+## Split a document into chunks on paragraph boundaries
+def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
+    """
+    Split text into chunks of at most `chunk_size` characters, merging consecutive paragraphs
+
+    Args:
+        text (str): Text content of the document
+        chunk_size (int): Maximum number of characters per chunk
+
+    Returns:
+        List[str]: The chunks, in document order
+    """
+    return list(iter_chunks([text], chunk_size))
+
+## Chunk a document as it is read, e.g. from `DocumentReader.iter_read`, without holding all of its text
+def iter_chunks(texts: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Split pieces of text (such as pages) into chunks of at most `chunk_size` characters, merging consecutive paragraphs
+
+    Args:
+        texts (Iterable[str]): Pieces of text content of the document, in document order
+        chunk_size (int): Maximum number of characters per chunk
+
+    Yields:
+        str: The chunks, in document order
+    """
+    current = ""
+    for text in texts:
+        for paragraph in text.split("\n\n"):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if current and len(current) + len(paragraph) + 2 > chunk_size:
+                yield current
+                current = ""
+            # Paragraphs longer than a chunk are split into fixed-size pieces
+            while len(paragraph) > chunk_size:
+                yield paragraph[:chunk_size]
+                paragraph = paragraph[chunk_size:]
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        yield current
+
+## An in-memory index used to retrieve the chunks of a document that are relevant to a question
+class DocumentIndex:
+    """Embedding index over the chunks of a single document."""
+
+    def __init__(self, chunks: List[str], embeddings: List[List[float]]):
+        """Initialize the index.
+
+        Args:
+            chunks: Chunks of the document, in document order
+            embeddings: Embedding of each chunk
+        """
+        self.chunks = chunks
+        # Rows are normalized to unit length up front so that cosine similarity is a single matrix-vector product
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.embeddings.ndim == 2:
+            norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+            self.embeddings /= np.where(norms == 0, 1, norms)
+
+    def search(self, query_embedding: List[float], k: int) -> List[str]:
+        """
+        Return the `k` chunks most similar to the query
+
+        Args:
+            query_embedding (List[float]): Embedding of the query
+            k (int): Number of chunks to return
+
+        Returns:
+            List[str]: The most similar chunks, in document order
+        """
+        if k >= len(self.chunks):
+            return list(self.chunks)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.embeddings @ (query / np.linalg.norm(query))
+        top = np.argpartition(-scores, k)[:k]
+        return [self.chunks[i] for i in sorted(top)]
@@ -1,12 +1,23 @@
+from typing import Optional
 import gradio as gr
 from pctopus.agent.document_qa import DocumentQAAgent
 from pctopus.llm.openai_llm import OpenAILLM
-from pctopus.reader.document_reader import DocumentReader
+from pctopus.reader.document_reader import SUPPORTED_FORMATS
 
-doc_reader = DocumentReader()
-supported_doc_formats = doc_reader.supported_formats()
+supported_doc_formats = list(SUPPORTED_FORMATS)
 
-def ask_doc_qa_agent(file_obj, question: str, model: str):
+## The agent and its OpenAI clients are created on first use and shared across requests,
+## so that HTTP connections are pooled instead of being set up for every question
+_doc_qa_agent: Optional[DocumentQAAgent] = None
+
+def get_doc_qa_agent() -> DocumentQAAgent:
+    """Return the shared document Q&A agent, creating it on first use."""
+    global _doc_qa_agent
+    if _doc_qa_agent is None:
+        _doc_qa_agent = DocumentQAAgent(OpenAILLM())
+    return _doc_qa_agent
+
+async def ask_doc_qa_agent(file_obj, question: str, model: str):
     """Process a document and answer questions using the specified OpenAI model.
     
     Args:
@@ -14,28 +25,29 @@ def ask_doc_qa_agent(file_obj, question: str, model: str):
         question: User's question about the document
         model: Name of the LLM model to use
         
-    Returns:
-        Answer to the question or error message
+    Yields:
+        The answer accumulated so far, so that the output updates as it is generated, or an error message
     """
     if file_obj is None:
-        return "Error: Please upload a document first."
+        yield "Error: Please upload a document first."
+        return
     
     if not question.strip():
-        return "Error: Please enter a question."
-
-    llm = OpenAILLM()
-    doc_qa_agent = DocumentQAAgent(llm)
+        yield "Error: Please enter a question."
+        return
 
     try:
-        response = doc_qa_agent.ask(
+        response = ""
+        async for chunk in get_doc_qa_agent().aask_stream(
             document_path=file_obj.name,
             question=question,
             model=model
-        )
-        return response
+        ):
+            response += chunk
+            yield response
 
     except Exception as e:
-        return f"Error: {str(e)}"
+        yield f"Error: {str(e)}"
 
 def create_document_qa_gradio_app():
     """Create a Gradio interface for document Q&A system."""
@@ -5,6 +5,10 @@ setup(
     name="pctopus",
     version="0.1.0",
     packages=find_packages(),
+    install_requires=[
+        "numpy",
+        "pymupdf",
+    ],
     author="Suhas Suresha",
     author_email="suhas17@stanford.edu",
     description="A package for building AI agents that can understand and control your PC",